@@ -1,11 +1,20 @@
 # app_lookup.py
 import os
 import json
+import atexit
+import shutil
+import tempfile
+import functools
+import itertools
 import pathlib
+from dataclasses import dataclass
+import orjson
 import pandas as pd
 import numpy as np
-from shapely import from_wkb
-from shapely.geometry import Point
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+from numba import njit
 from shapely.strtree import STRtree
 
 # ---------- Config & paths ----------
@@ -13,94 +22,480 @@ DATA_DIR = pathlib.Path(os.getenv("DATA_DIR", "/data"))
 GEOMS_ENV = os.getenv("GEOMS_PATH", "").strip()
 GEOMS_PATH = pathlib.Path(GEOMS_ENV) if GEOMS_ENV else (DATA_DIR / "tracts_wkb.parquet")
 SCORES_PATH = pathlib.Path(os.getenv("SCORES_PATH", "./tract_lookup.json"))
+# Max children per STRtree node; 8-16 suits polygon data, GEOS default is 10
+STRTREE_NODE_CAPACITY = int(os.getenv("STRTREE_NODE_CAPACITY", "10"))
+# Set by _load_shared() in the pre-fork parent; workers map arrays from here
+SHARED_ARRAYS_DIR = os.getenv("SHARED_ARRAYS_DIR", "").strip()
+# Entries in the single-point lookup cache (repeat geocodes of the same address)
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "100000"))
 
 # ---------- Module-level state (lazy-loaded) ----------
-df: pd.DataFrame | None = None         # DataFrame with GEOID + wkb
-geoms: list | None = None              # list[shapely geometry]
-tree: STRtree | None = None            # spatial index
-geoid_by_geom_id: dict = {}            # id(geom) -> GEOID
-geoid_by_idx: list[str] | None = None  # index -> GEOID (aligned with geoms)
-scores: dict = {}                      # GEOID -> score
+@dataclass(frozen=True, eq=False)
+class _Index:
+    """
+    Everything a lookup reads. _load() / _attach_shared() build a new one and
+    publish it in a single assignment; lookups read `_index` once, so a
+    concurrent or failed reload never mixes old and new arrays.
+    """
+    geoms: np.ndarray              # ndarray[shapely geometry]
+    tree: STRtree                  # spatial index
+    geoid_by_idx: np.ndarray       # index -> GEOID (aligned with geoms)
+    bounds_arr: np.ndarray         # index -> (minx, miny, maxx, maxy)
+    is_rectangular: np.ndarray     # index -> True if geometry == its bbox
+    ring_offsets: np.ndarray       # ring -> [start, end) into coords_x/coords_y
+    poly_ring_offsets: np.ndarray  # index -> [start, end) into ring_offsets
+    coords_x: np.ndarray           # all ring vertices, x (lon) - tract minx, float32
+    coords_y: np.ndarray           # all ring vertices, y (lat) - tract miny, float32
+    grid_extent: tuple             # (minx, miny, maxx, maxy) covered by the grid
+    grid_n: int                    # grid is grid_n x grid_n cells
+    grid_cell_size: tuple          # (cell width, cell height)
+    grid_cell_offsets: np.ndarray  # cell -> [start, end) into grid_cell_polys
+    grid_cell_polys: np.ndarray    # indices of tracts whose bbox touches each cell
+    scores: dict                   # GEOID -> score
+    scores_arr: np.ndarray         # index -> score as float64 (NaN if missing/null)
+    scores_present: np.ndarray     # index -> True if a score exists
+    version: int                   # distinct per load; part of the lookup cache key
+
+df: pd.DataFrame | None = None     # DataFrame with GEOID (+ wkb for WKB input)
+_index: _Index | None = None       # current index; replaced whole on reload
+_versions = itertools.count()
+
+# ---------- Point-in-polygon kernel ----------
+# Shewchuk's error bound for a float64 2D orientation test; below it the sign
+# of the cross product can't be trusted
+_ORIENT_ERRBOUND = 3.3306690738754716e-16
+# SoA vertices are float32 offsets from their tract's bbox min corner, so
+# rounding moves a vertex by at most ~2^-24 * tract extent. Points farther
+# than this margin (x extent) from every edge get the float64 polygon's answer.
+_F32_MARGIN = 2.0 ** -21
+
+@njit("int8(float64, float64, float64, int64, int64, int64[:], float32[:], float32[:])",
+      cache=True, nogil=True)
+def _pip_crossing(qx, qy, m, ring_start, ring_end, ring_offsets, xs, ys):
+    """
+    Even-odd crossing-number test of (qx, qy), relative to the tract origin,
+    against rings [ring_start, ring_end) (exteriors and holes of every part).
+    Returns 1 if inside, 0 if outside, -1 if within margin m of an edge, where
+    float32 rounding could matter and points on the boundary live (caller
+    falls back to GEOS covers()).
+    """
+    inside = False
+    for r in range(ring_start, ring_end):
+        # Rings are closed (last vertex == first), so edges are (j, j + 1)
+        for j in range(ring_offsets[r], ring_offsets[r + 1] - 1):
+            x0, y0 = np.float64(xs[j]), np.float64(ys[j])
+            x1, y1 = np.float64(xs[j + 1]), np.float64(ys[j + 1])
+            if qy < min(y0, y1) - m or qy > max(y0, y1) + m or qx > max(x0, x1) + m:
+                continue  # clear of the edge and not left of it
+            straddles = (y0 > qy) != (y1 > qy)
+            if qx < min(x0, x1) - m:
+                if straddles:
+                    inside = not inside
+                continue
+            dx, dy = x1 - x0, y1 - y0
+            if dx == 0.0 and dy == 0.0:
+                continue  # repeated vertex
+            ab = dx * (qy - y0)
+            cd = (qx - x0) * dy
+            cross = ab - cd
+            if (cross * cross <= m * m * (dx * dx + dy * dy)
+                    or abs(cross) <= _ORIENT_ERRBOUND * (abs(ab) + abs(cd))):
+                return -1
+            if straddles and (cross > 0) == (dy > 0):
+                inside = not inside
+    return 1 if inside else 0
+
+@njit("UniTuple(int64, 2)(float64, float64, int64[:], int64, int64, boolean[:], float64[:, :], "
+      "int64[:], int64[:], float32[:], float32[:])", cache=True, nogil=True)
+def _first_candidate_hit(px, py, candidates, start, end, is_rect, bounds, poly_ring_offsets,
+                         ring_offsets, xs, ys):
+    """
+    Scan candidates[start:end] in one native loop and return (pos, res) for
+    the first one that contains (px, py) (res=1) or is undecided (res=-1);
+    (-1, 0) if none does.
+    """
+    for pos in range(start, end):
+        idx = candidates[pos]
+        minx, miny, maxx, maxy = bounds[idx, 0], bounds[idx, 1], bounds[idx, 2], bounds[idx, 3]
+        # Candidates share the point's grid cell, not necessarily its bbox
+        if not (minx <= px <= maxx and miny <= py <= maxy):
+            continue
+        if is_rect[idx]:
+            return pos, 1
+        m = _F32_MARGIN * max(maxx - minx, maxy - miny)
+        res = _pip_crossing(px - minx, py - miny, m, poly_ring_offsets[idx],
+                            poly_ring_offsets[idx + 1], ring_offsets, xs, ys)
+        if res != 0:
+            return pos, res
+    return -1, 0
+
+def _ring_soa(geoms_arr: np.ndarray, bounds: np.ndarray) -> tuple:
+    """
+    Flatten all polygon rings into contiguous arrays for _pip_crossing:
+    (ring_offsets, poly_ring_offsets, xs, ys), with xs/ys as float32 offsets
+    from each tract's bbox min corner.
+    """
+    geom_type, coords, offsets = shapely.to_ragged_array(geoms_arr)
+    ring_offsets = np.asarray(offsets[0], dtype=np.int64)
+    if geom_type == shapely.GeometryType.POLYGON:
+        poly_ring_offsets = np.asarray(offsets[1], dtype=np.int64)
+    elif geom_type == shapely.GeometryType.MULTIPOLYGON:
+        poly_ring_offsets = np.asarray(offsets[1][offsets[2]], dtype=np.int64)  # geom -> part -> ring
+    else:
+        raise ValueError(f"Expected polygon geometries, got {geom_type.name}")
+
+    # Tract index of every vertex, to subtract its origin
+    ring_poly = np.repeat(np.arange(len(geoms_arr)), np.diff(poly_ring_offsets))
+    coord_poly = np.repeat(ring_poly, np.diff(ring_offsets))
+    xs = (coords[:, 0] - bounds[coord_poly, 0]).astype(np.float32)
+    ys = (coords[:, 1] - bounds[coord_poly, 1]).astype(np.float32)
+    return ring_offsets, poly_ring_offsets, xs, ys
+
+# ---------- Uniform grid (point -> candidate tracts) ----------
+@njit("UniTuple(int64[:], 2)(int64[:], int64[:], int64[:], int64[:], int64)", cache=True)
+def _grid_csr(cx0, cy0, cx1, cy1, n):
+    """CSR (offsets, tract indices) of tracts whose cell range covers each cell."""
+    offsets = np.zeros(n * n + 1, dtype=np.int64)
+    for i in range(len(cx0)):
+        for cy in range(cy0[i], cy1[i] + 1):
+            for cx in range(cx0[i], cx1[i] + 1):
+                offsets[cy * n + cx + 1] += 1
+    offsets = np.cumsum(offsets)
+    polys = np.empty(offsets[-1], dtype=np.int64)
+    fill = offsets[:-1].copy()
+    for i in range(len(cx0)):
+        for cy in range(cy0[i], cy1[i] + 1):
+            for cx in range(cx0[i], cx1[i] + 1):
+                c = cy * n + cx
+                polys[fill[c]] = i
+                fill[c] += 1
+    return offsets, polys
+
+def _build_grid(bounds: np.ndarray) -> tuple:
+    """
+    Rasterize tract bboxes into an n x n grid over their total extent
+    (n = sqrt(#tracts)). Returns (extent, n, cell_size, cell_offsets, cell_polys).
+    """
+    valid = ~np.isnan(bounds).any(axis=1)  # empty geometries have NaN bounds
+    minx, miny = bounds[valid, 0].min(), bounds[valid, 1].min()
+    maxx, maxy = bounds[valid, 2].max(), bounds[valid, 3].max()
+    n = max(1, int(np.sqrt(valid.sum())))
+    cell_w = (maxx - minx) / n or 1.0
+    cell_h = (maxy - miny) / n or 1.0
+
+    # Same float ops as _lookup_native, so a point inside a bbox lands in its cells
+    b = np.where(valid[:, None], bounds, [minx, miny, minx, miny])
+    cx0 = np.minimum(((b[:, 0] - minx) / cell_w).astype(np.int64), n - 1)
+    cy0 = np.minimum(((b[:, 1] - miny) / cell_h).astype(np.int64), n - 1)
+    cx1 = np.where(valid, np.minimum(((b[:, 2] - minx) / cell_w).astype(np.int64), n - 1), -1)
+    cy1 = np.minimum(((b[:, 3] - miny) / cell_h).astype(np.int64), n - 1)
+    offsets, polys = _grid_csr(cx0, cy0, cx1, cy1, n)
+    return (minx, miny, maxx, maxy), n, (cell_w, cell_h), offsets, polys
+
+@njit("UniTuple(int64, 3)(float64, float64, float64, float64, float64, float64, float64, "
+      "float64, int64, int64[:], int64[:], boolean[:], float64[:, :], int64[:], int64[:], "
+      "float32[:], float32[:])", cache=True, nogil=True)
+def _lookup_native(px, py, minx, miny, maxx, maxy, cell_w, cell_h, n, cell_offsets, cell_polys,
+                   is_rect, bounds, poly_ring_offsets, ring_offsets, xs, ys):
+    """
+    Whole single-point lookup in one native call: grid cell, then the
+    candidate scan of _first_candidate_hit. Returns (pos, end, res) with pos
+    into cell_polys (-1 if no tract or outside the grid) and end the cell's
+    last candidate position.
+    """
+    if not (minx <= px <= maxx and miny <= py <= maxy):
+        return -1, 0, 0
+    cx = min(int((px - minx) / cell_w), n - 1)
+    cy = min(int((py - miny) / cell_h), n - 1)
+    cell = cy * n + cx
+    end = cell_offsets[cell + 1]
+    pos, res = _first_candidate_hit(px, py, cell_polys, cell_offsets[cell], end, is_rect, bounds,
+                                    poly_ring_offsets, ring_offsets, xs, ys)
+    return pos, end, res
 
 def _exists_ok() -> tuple[bool, bool]:
     return GEOMS_PATH.exists(), SCORES_PATH.exists()
 
+def _geoms_from_geoarrow(col: pa.ChunkedArray) -> np.ndarray:
+    """
+    Build shapely geometries directly from a GeoArrow polygon/multipolygon
+    column (nested lists of x/y coords), skipping per-row WKB parsing.
+    """
+    arr = col.combine_chunks()
+    offsets = []
+    while pa.types.is_list(arr.type) or pa.types.is_large_list(arr.type):
+        offsets.append(arr.offsets.to_numpy())
+        arr = arr.values
+
+    if pa.types.is_struct(arr.type):  # separated: struct<x, y>
+        coords = np.column_stack([arr.field("x").to_numpy(), arr.field("y").to_numpy()])
+    elif pa.types.is_fixed_size_list(arr.type):  # interleaved: [x, y, ...]
+        coords = arr.values.to_numpy().reshape(-1, arr.type.list_size)[:, :2]
+    else:
+        raise ValueError(f"Unsupported GeoArrow coordinate type: {arr.type}")
+
+    if len(offsets) == 2:
+        geom_type = shapely.GeometryType.POLYGON
+    elif len(offsets) == 3:
+        geom_type = shapely.GeometryType.MULTIPOLYGON
+    else:
+        raise ValueError("GeoArrow geometry must be polygon or multipolygon")
+
+    # Arrow nests outermost-first; shapely wants innermost (ring) offsets first
+    return shapely.from_ragged_array(geom_type, coords, tuple(reversed(offsets)))
+
+def _read_scores(path: pathlib.Path) -> dict:
+    """GEOID -> score JSON, parsed with orjson and coerced to float (or None) once."""
+    raw = path.read_bytes()
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        data = json.loads(raw)  # e.g. NaN literals, which orjson rejects
+    return {k: None if v is None else float(v) for k, v in data.items()}
+
 def _load() -> None:
     """(Re)load geometries, build STRtree, and load scores."""
-    global df, geoms, tree, geoid_by_geom_id, geoid_by_idx, scores
+    global df
 
     if not GEOMS_PATH.exists():
         raise FileNotFoundError(f"Geometry parquet missing: {GEOMS_PATH}")
     if not SCORES_PATH.exists():
         raise FileNotFoundError(f"Scores JSON missing: {SCORES_PATH}")
 
-    # Expect exactly two columns: GEOID (str-like), wkb (bytes)
-    df = pd.read_parquet(GEOMS_PATH)
-    if not {"GEOID", "wkb"}.issubset(df.columns):
-        raise ValueError("Parquet must contain columns: GEOID, wkb")
+    # Expect GEOID (str-like) plus either wkb (bytes) or a geometry column,
+    # GeoArrow-encoded (see to_geoarrow.py) or WKB (GeoParquet's default)
+    table = pq.read_table(GEOMS_PATH)
+    cols = set(table.column_names)
+    if "GEOID" not in cols or not cols & {"wkb", "geometry"}:
+        raise ValueError("Parquet must contain columns: GEOID, wkb (or GeoParquet geometry)")
 
     # Build shapely geometries & spatial index
-    geoids = df["GEOID"].astype(str).values
-    geoms_list = [from_wkb(w) for w in df["wkb"].values]
-    idx_tree = STRtree(geoms_list)
+    if "wkb" in cols:
+        df_new = table.select(["GEOID", "wkb"]).to_pandas()
+        geoms_arr = shapely.from_wkb(df_new["wkb"].to_numpy())  # one vectorized GEOS call
+    else:
+        df_new = table.select(["GEOID"]).to_pandas()
+        geom_col = table.column("geometry")
+        if pa.types.is_binary(geom_col.type) or pa.types.is_large_binary(geom_col.type):
+            geoms_arr = shapely.from_wkb(geom_col.to_numpy())  # WKB-encoded GeoParquet
+        else:
+            geoms_arr = _geoms_from_geoarrow(geom_col)
+    idx_tree = STRtree(geoms_arr, node_capacity=STRTREE_NODE_CAPACITY)
+    shapely.prepare(geoms_arr)  # cache GEOS prepared geometries up front
+
+    # Tracts that are exactly their bbox (topologically equal, so no notch of
+    # any size) can be tested with four comparisons instead of a GEOS predicate
+    bounds_arr = shapely.bounds(geoms_arr)
+    is_rectangular = shapely.equals(geoms_arr, shapely.box(*bounds_arr.T))
 
-    # Maps for both STRtree return modes
-    geoid_by_idx = list(geoids)  # index -> GEOID
-    geoid_by_geom_id = {id(g): geoid for g, geoid in zip(geoms_list, geoids)}
+    # Ring coordinates in SoA layout for the JIT'd point-in-polygon test
+    ring_offsets, poly_ring_offsets, coords_x, coords_y = _ring_soa(geoms_arr, bounds_arr)
+
+    # Grid pre-filter for single-point lookups: O(1) cell -> candidate tracts
+    (grid_extent, grid_n, grid_cell_size,
+     grid_cell_offsets, grid_cell_polys) = _build_grid(bounds_arr)
+
+    # STRtree.query returns int indices into geoms (shapely >= 2.0)
+    geoid_by_idx = df_new["GEOID"].astype(str).to_numpy().astype(np.str_)  # index -> GEOID
 
     # Load scores
-    with open(SCORES_PATH, "r") as f:
-        scores = json.load(f)
+    scores = _read_scores(SCORES_PATH)
+
+    # Scores aligned with geoms, so hits index an array instead of hashing GEOIDs
+    scores_arr = np.fromiter(
+        (np.nan if (v := scores.get(g)) is None else v for g in geoid_by_idx.tolist()),
+        dtype=np.float64, count=len(geoid_by_idx))
+    scores_present = ~np.isnan(scores_arr)
 
     # Commit to globals last (so we don’t leave half-initialized state)
-    geoms = geoms_list
-    tree = idx_tree
+    df = df_new
+    _publish(_Index(geoms_arr, idx_tree, geoid_by_idx, bounds_arr, is_rectangular,
+                    ring_offsets, poly_ring_offsets, coords_x, coords_y,
+                    grid_extent, grid_n, grid_cell_size, grid_cell_offsets, grid_cell_polys,
+                    scores, scores_arr, scores_present, next(_versions)))
 
-    print(f"[startup] Loaded polygons: {len(geoms)} | scores: {len(scores)}")
+    print(f"[startup] Loaded polygons: {len(geoms_arr)} | scores: {len(scores)}")
     print(f"[startup] GEOMS_PATH={GEOMS_PATH} | SCORES_PATH={SCORES_PATH}")
 
+def _publish(index: _Index) -> None:
+    """Swap in a fully built index and drop cached lookups from the old one."""
+    global _index
+    _index = index
+    _latlon_to_geoid_score_cached.cache_clear()
+
+def _unload() -> None:
+    """Drop the loaded index and DataFrame (e.g. in serve.py's supervisor, which never serves)."""
+    global df, _index
+    df = None
+    _index = None
+    _latlon_to_geoid_score_cached.cache_clear()
+
+# Numpy state that _load_shared() publishes and _attach_shared() maps
+_SHARED_ARRAYS = ("geoid_by_idx", "bounds_arr", "is_rectangular", "ring_offsets",
+                  "poly_ring_offsets", "coords_x", "coords_y", "grid_cell_offsets",
+                  "grid_cell_polys", "scores_arr", "scores_present")
+
+def _load_shared() -> pathlib.Path:
+    """
+    Pre-fork parent: load once, then dump the numpy state as .npy files that
+    every worker memory-maps (_attach_shared) instead of re-reading the parquet.
+    Publishes the directory via SHARED_ARRAYS_DIR; it is removed at exit.
+    Raises OSError (and removes the directory) if the files can't be written.
+    """
+    if not ready():
+        _load()
+
+    # Regular temp dir, not /dev/shm: mapped files already share page-cache
+    # pages across workers, and container /dev/shm (64 MB) is too small for
+    # national tract data
+    shared_dir = pathlib.Path(tempfile.mkdtemp(prefix="tract-arrays-"))
+    atexit.register(shutil.rmtree, shared_dir, ignore_errors=True)
+
+    index = _index
+    try:
+        # Exact float64 coords for rebuilding the GEOS geometries in workers
+        geom_type, coords, offsets = shapely.to_ragged_array(index.geoms)
+        for name in _SHARED_ARRAYS:
+            np.save(shared_dir / f"{name}.npy", getattr(index, name))
+        np.save(shared_dir / "ragged_coords.npy", coords)
+        for i, off in enumerate(offsets):
+            np.save(shared_dir / f"ragged_offsets_{i}.npy", off)
+        meta = {"geom_type": int(geom_type), "n_ragged_offsets": len(offsets),
+                "grid_extent": index.grid_extent, "grid_n": index.grid_n,
+                "grid_cell_size": index.grid_cell_size}
+        (shared_dir / "meta.json").write_text(json.dumps(meta))
+        (shared_dir / "scores.json").write_bytes(orjson.dumps(index.scores))
+    except OSError:
+        shutil.rmtree(shared_dir, ignore_errors=True)
+        raise
+
+    os.environ["SHARED_ARRAYS_DIR"] = str(shared_dir)
+    print(f"[startup] Shared arrays published: {shared_dir}")
+    return shared_dir
+
+def _attach_shared(shared_dir: pathlib.Path) -> None:
+    """
+    Worker: map the arrays published by _load_shared() (pages are shared
+    with the other workers) and rebuild geometries + STRtree from them.
+    """
+    global df
+
+    meta = json.loads((shared_dir / "meta.json").read_text())
+    # Copy-on-write maps: never written, but numba's signatures need writable arrays
+    arrays = {name: np.load(shared_dir / f"{name}.npy", mmap_mode="c") for name in _SHARED_ARRAYS}
+    offsets = tuple(np.load(shared_dir / f"ragged_offsets_{i}.npy", mmap_mode="c")
+                    for i in range(meta["n_ragged_offsets"]))
+    geom_type = shapely.GeometryType(meta["geom_type"])
+
+    # Geometries come straight from the shared coordinate buffers (no WKB parse)
+    coords = np.load(shared_dir / "ragged_coords.npy", mmap_mode="r")
+    geoms_arr = shapely.from_ragged_array(geom_type, coords, offsets)
+    idx_tree = STRtree(geoms_arr, node_capacity=STRTREE_NODE_CAPACITY)
+    shapely.prepare(geoms_arr)
+
+    df = None
+    _publish(_Index(geoms=geoms_arr, tree=idx_tree, **arrays,
+                    grid_extent=tuple(meta["grid_extent"]), grid_n=meta["grid_n"],
+                    grid_cell_size=tuple(meta["grid_cell_size"]),
+                    scores=_read_scores(shared_dir / "scores.json"), version=next(_versions)))
+
+    print(f"[startup] Attached shared arrays: {shared_dir} | polygons: {len(geoms_arr)}")
+
 def ready() -> bool:
     """True if index and scores are loaded."""
-    return tree is not None and geoms is not None and len(scores) > 0
+    index = _index
+    return index is not None and len(index.scores) > 0
+
+def _score_at(index: _Index, idx) -> float | None:
+    """Score for tree index idx; None if the tract has no (or a null) score."""
+    return float(index.scores_arr[idx]) if index.scores_present[idx] else None
 
-def latlon_to_geoid_score(lat: float, lon: float) -> tuple[str | None, float | int | None]:
+def latlon_to_geoid_score(lat: float, lon: float) -> tuple[str | None, float | None]:
     """
-    Robust to STRtree returning either geometry objects or integer indices,
-    depending on platform/build.
+    lat/lon -> (GEOID, score) of the tract covering the point; on a boundary
+    shared by several tracts, the one with the lowest index.
     """
     if not ready():
         raise RuntimeError("Index not loaded yet. Upload file(s) and call /reload.")
 
-    pt = Point(lon, lat)
-    candidates = tree.query(pt)  # may be geometries OR int indices
-
-    for cand in candidates:
-        try:
-            # Case A: query returned indices (int / numpy.int64)
-            if isinstance(cand, (int, np.integer)):
-                idx = int(cand)
-                geom = geoms[idx]
-                if geom.covers(pt):  # covers() is boundary-friendly
-                    geoid = geoid_by_idx[idx]
-                    return geoid, scores.get(geoid)
-
-            # Case B: query returned geometry objects
-            else:
-                geom = cand
-                if geom.covers(pt):
-                    geoid = geoid_by_geom_id[id(geom)]
-                    return geoid, scores.get(geoid)
-
-        except Exception:
-            # Ignore this candidate and continue scanning others
-            continue
+    # Outside the tracts' total bounds, or NaN (fails every comparison):
+    # no tract, and not worth a cache entry
+    index = _index
+    minx, miny, maxx, maxy = index.grid_extent
+    if not (minx <= lon <= maxx and miny <= lat <= maxy):
+        return None, None
+    return _latlon_to_geoid_score_cached(index.version, lat, lon)
+
+@functools.lru_cache(maxsize=LOOKUP_CACHE_SIZE)
+def _latlon_to_geoid_score_cached(version: int, lat: float, lon: float) -> tuple[str | None, float | None]:
+    # Keyed on the index version rather than the index itself, so entries
+    # don't pin an old index. If a reload lands in between, the answer comes
+    # from the newer index but is filed under the old version, never read again.
+    index = _index
+    pos, end, res = _lookup_native(lon, lat, *index.grid_extent, *index.grid_cell_size,
+                                   index.grid_n, index.grid_cell_offsets, index.grid_cell_polys,
+                                   index.is_rectangular, index.bounds_arr, index.poly_ring_offsets,
+                                   index.ring_offsets, index.coords_x, index.coords_y)
+    if pos < 0:
+        return None, None
+    if res < 0:
+        # Too close to an edge for the kernel: GEOS checks the remaining
+        # candidates in one vectorized covers() call
+        covered = shapely.covers(index.geoms[index.grid_cell_polys[pos:end]],
+                                 shapely.points(lon, lat))
+        if not covered.any():
+            return None, None
+        pos += int(np.argmax(covered))
+
+    idx = index.grid_cell_polys[pos]
+    return str(index.geoid_by_idx[idx]), _score_at(index, idx)
+
+def latlons_to_geoid_scores(points) -> list[tuple[str | None, float | None]]:
+    """
+    Bulk variant of latlon_to_geoid_score for a sequence of (lat, lon) pairs.
+    All points go through a single vectorized STRtree query instead of one
+    Point + tree.query per pair.
+    """
+    if not ready():
+        raise RuntimeError("Index not loaded yet. Upload file(s) and call /reload.")
+    index = _index
+
+    n = len(points)
+    lats = np.fromiter((p[0] for p in points), dtype=np.float64, count=n)
+    lons = np.fromiter((p[1] for p in points), dtype=np.float64, count=n)
+
+    # Only points inside the tracts' total bounds can hit (NaN never is)
+    minx, miny, maxx, maxy = index.grid_extent
+    in_extent = np.flatnonzero((lons >= minx) & (lons <= maxx) & (lats >= miny) & (lats <= maxy))
+    pts = shapely.points(lons[in_extent], lats[in_extent])
+
+    # Envelope candidates from the tree, then one vectorized covers() over all
+    # (tract, point) pairs. tree.query(predicate=...) only prepares the query
+    # points; shapely.covers uses the tracts prepared in _load()
+    pt_idx, tree_idx = index.tree.query(pts)
+    covered = shapely.covers(index.geoms[tree_idx], pts[pt_idx])
+    input_idx, tree_idx = in_extent[pt_idx[covered]], tree_idx[covered]
+
+    # Boundary points can be covered by several tracts; keep the lowest tract
+    # index, the same tie rule as the grid scan in latlon_to_geoid_score
+    order = np.lexsort((tree_idx, input_idx))
+    input_idx, tree_idx = input_idx[order], tree_idx[order]
+    hit_input, first = np.unique(input_idx, return_index=True)
+    hit_idx = tree_idx[first]
+    hit_geoids = index.geoid_by_idx[hit_idx].tolist()
+    hit_scores = np.where(index.scores_present[hit_idx], index.scores_arr[hit_idx], None).tolist()
 
-    return None, None
+    out: list[tuple[str | None, float | None]] = [(None, None)] * n
+    for i, geoid, score in zip(hit_input.tolist(), hit_geoids, hit_scores):
+        out[i] = (geoid, score)
+    return out
 
 # Try to autoload at import; if files aren’t there, don’t crash.
 try:
     g_ok, s_ok = _exists_ok()
-    if g_ok and s_ok:
+    if SHARED_ARRAYS_DIR:
+        _attach_shared(pathlib.Path(SHARED_ARRAYS_DIR))
+    elif g_ok and s_ok:
         _load()
     else:
         print(f"[startup] Waiting for files. geometry={g_ok}, scores={s_ok}. "
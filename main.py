@@ -1,11 +1,25 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import ORJSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List, Tuple
 
-from app_lookup import _load, ready, latlon_to_geoid_score, GEOMS_PATH, SCORES_PATH
+from app_lookup import (_load, ready, latlon_to_geoid_score, latlons_to_geoid_scores,
+                        GEOMS_PATH, SCORES_PATH)
+
+# Worker processes serving this app (serve.py and uvicorn --workers both read it)
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+
+# /score_bulk splits large batches into chunks looked up in parallel threads;
+# the vectorized shapely/GEOS calls release the GIL
+BULK_CHUNK_SIZE = 2048
+_EXECUTOR = ThreadPoolExecutor(max_workers=min(8, os.cpu_count() or 1))
 
 app = FastAPI(title="Tract Score API", version="1.0.0",
-              description="lat,lon → Census tract GEOID + precomputed score")
+              description="lat,lon → Census tract GEOID + precomputed score",
+              default_response_class=ORJSONResponse)
 
 class ScoreResponse(BaseModel):
     geoid: str
@@ -32,6 +46,11 @@ def readyz():
 
 @app.post("/reload")
 def reload_index():
+    # With several workers a reload would only reach the worker serving this
+    # request and leave the others on the old data (or still not loaded)
+    if WEB_CONCURRENCY > 1:
+        raise HTTPException(status_code=409,
+                            detail="Running multiple workers; restart the service to reload.")
     try:
         _load()
         return {"ok": True}
@@ -51,18 +70,32 @@ def score(
         raise HTTPException(status_code=404, detail="Point not inside any tract")
     return {"geoid": geoid, "score": s}
 
+def _lookup_bulk(points):
+    if len(points) <= BULK_CHUNK_SIZE:
+        return latlons_to_geoid_scores(points)
+    chunks = [points[i:i + BULK_CHUNK_SIZE] for i in range(0, len(points), BULK_CHUNK_SIZE)]
+    return [r for part in _EXECUTOR.map(latlons_to_geoid_scores, chunks) for r in part]
+
+def _bulk_item(lat, lon, geoid=None, score=None, ok=False, error=None) -> dict:
+    """BulkItem as a plain dict."""
+    return {"lat": lat, "lon": lon, "geoid": geoid, "score": score, "ok": ok, "error": error}
+
 @app.post("/score_bulk", response_model=list[BulkItem])
 def score_bulk(req: BulkRequest):
-    out: list[BulkItem] = []
-    for lat, lon in req.points:
-        try:
-            geoid, s = latlon_to_geoid_score(lat, lon)
-            if geoid is None:
-                out.append(BulkItem(lat=lat, lon=lon, ok=False, error="not_in_tract"))
-            else:
-                out.append(BulkItem(lat=lat, lon=lon, geoid=geoid, score=s, ok=True))
-        except RuntimeError as e:
-            out.append(BulkItem(lat=lat, lon=lon, ok=False, error=str(e)))
-        except Exception as e:
-            out.append(BulkItem(lat=lat, lon=lon, ok=False, error=f"error:{e}"))
-    return out
+    # Items are built as plain dicts and returned as a Response, which skips
+    # pydantic validation/serialization of large batches (the response_model
+    # still documents the shape)
+    try:
+        results = _lookup_bulk(req.points)
+    except RuntimeError as e:
+        return ORJSONResponse([_bulk_item(lat, lon, error=str(e)) for lat, lon in req.points])
+    except Exception as e:
+        return ORJSONResponse([_bulk_item(lat, lon, error=f"error:{e}") for lat, lon in req.points])
+
+    out = []
+    for (lat, lon), (geoid, s) in zip(req.points, results):
+        if geoid is None:
+            out.append(_bulk_item(lat, lon, error="not_in_tract"))
+        else:
+            out.append(_bulk_item(lat, lon, geoid=geoid, score=s, ok=True))
+    return ORJSONResponse(out)
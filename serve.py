@@ -0,0 +1,25 @@
+# serve.py
+"""
+Start uvicorn with WEB_CONCURRENCY workers. With more than one worker the
+tract data is loaded once here, before starting workers, which memory-map the
+shared arrays instead of each re-reading the parquet (see
+app_lookup._load_shared / _attach_shared).
+"""
+import os
+import uvicorn
+
+import app_lookup
+
+if __name__ == "__main__":
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1 and app_lookup.ready():
+        try:
+            app_lookup._load_shared()
+        except OSError as e:  # e.g. ENOSPC; workers then each load on their own
+            print("[startup] WARNING: not sharing arrays across workers:", str(e))
+    if workers > 1:
+        # Workers are spawned and load or attach on their own; the supervisor
+        # never serves, so don't keep a full copy of the index alive here
+        app_lookup._unload()
+    uvicorn.run("main:app", host="0.0.0.0", port=int(os.getenv("PORT", "10000")),
+                workers=workers)
@@ -0,0 +1,264 @@
+import os
+import json
+import errno
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import shapely
+from fastapi.testclient import TestClient
+from shapely.geometry import MultiPolygon, Polygon, box
+
+import app_lookup
+import main
+import to_geoarrow
+
+N = 40  # tiling is N x N jittered quads
+
+def _tiling(rng) -> list:
+    """
+    Jittered quad tiling (shared edges and vertices) with subdivided edges, a
+    few tracts with holes filled by their own tract, multipolygons with a
+    detached island, and a strip of exact rectangles.
+    """
+    xs, ys = np.linspace(-100, -90, N + 1), np.linspace(30, 40, N + 1)
+    X, Y = np.meshgrid(xs, ys, indexing="ij")
+    X[1:-1, 1:-1] += rng.uniform(-0.05, 0.05, (N - 1, N - 1))
+    Y[1:-1, 1:-1] += rng.uniform(-0.05, 0.05, (N - 1, N - 1))
+
+    t = np.linspace(0, 1, 4, endpoint=False)[:, None]
+    geoms, islands = [], 0
+    for i in range(N):
+        for j in range(N):
+            c = [np.array([X[a, b], Y[a, b]]) for a, b in ((i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1))]
+            poly = Polygon(np.vstack([c[k] + t * (c[(k + 1) % 4] - c[k]) for k in range(4)]))
+            if (i * N + j) % 37 == 0:
+                hole = poly.centroid.buffer(0.05, 4)
+                poly = poly.difference(hole)
+                geoms.append(hole)
+            if (i * N + j) % 41 == 0:
+                islands += 1
+                poly = MultiPolygon([poly, box(-89 + islands * 0.1, 30, -89 + islands * 0.1 + 0.05, 30.05)])
+            geoms.append(poly)
+    geoms += [box(-80 + k * 0.1, 30, -80 + (k + 1) * 0.1, 30.1) for k in range(20)]
+    return geoms
+
+def _write_tracts(d, geoms, geoids, scores) -> None:
+    """GEOID + wkb parquet and scores JSON, as GEOMS_PATH / SCORES_PATH expect."""
+    pd.DataFrame({"GEOID": geoids, "wkb": shapely.to_wkb(geoms)}).to_parquet(d / "tracts_wkb.parquet")
+    (d / "scores.json").write_text(json.dumps(scores))
+
+@pytest.fixture(scope="module")
+def tracts(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    geoms = np.array(_tiling(rng), dtype=object)
+    geoids = [f"{i:011d}" for i in range(len(geoms))]
+    scores = {g: float(i % 100) for i, g in enumerate(geoids)}
+    for g in geoids[::50]:
+        scores[g] = None
+    for g in geoids[1::50]:
+        del scores[g]
+
+    d = tmp_path_factory.mktemp("tracts")
+    mp = pytest.MonkeyPatch()
+    mp.setattr(app_lookup, "GEOMS_PATH", d / "tracts_wkb.parquet")
+    mp.setattr(app_lookup, "SCORES_PATH", d / "scores.json")
+    _write_tracts(d, geoms, geoids, scores)
+    app_lookup._load()
+    yield geoms, np.array(geoids), scores
+    mp.undo()
+
+@pytest.fixture
+def restore_index(tracts):
+    """Put the shared fixture data back after a test that loads or attaches other state."""
+    saved_df, saved_index = app_lookup.df, app_lookup._index
+    yield
+    app_lookup.df = saved_df
+    app_lookup._publish(saved_index)
+
+@pytest.fixture
+def load(restore_index, tmp_path, monkeypatch):
+    """
+    Load other tracts/scores for one test: load(geoms, geoids, scores) writes
+    them under tmp_path and calls _load().
+    """
+    monkeypatch.setattr(app_lookup, "GEOMS_PATH", tmp_path / "tracts_wkb.parquet")
+    monkeypatch.setattr(app_lookup, "SCORES_PATH", tmp_path / "scores.json")
+
+    def _load(geoms, geoids, scores):
+        _write_tracts(tmp_path, geoms, geoids, scores)
+        app_lookup._load()
+
+    return _load
+
+@pytest.fixture
+def tmp_tempdir(tmp_path, monkeypatch):
+    """Point tempfile (and so _load_shared's snapshot dir) at tmp_path."""
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    monkeypatch.delenv("SHARED_ARRAYS_DIR", raising=False)  # restored after the test
+    return tmp_path
+
+@pytest.fixture(scope="module")
+def client(tracts):
+    return TestClient(main.app)
+
+def test_score_and_score_bulk_agree_on_vertices(tracts, client):
+    geoms, _, _ = tracts
+    # Tiling vertices sit on boundaries shared by up to four tracts
+    coords = shapely.get_coordinates(geoms[:N * N])
+    rng = np.random.default_rng(1)
+    lon, lat = coords[rng.choice(len(coords), 500, replace=False)].T
+
+    bulk = client.post("/score_bulk", json={"points": np.column_stack([lat, lon]).tolist()}).json()
+    for a, b, item in zip(lat.tolist(), lon.tolist(), bulk):
+        r = client.get("/score", params={"lat": a, "lon": b})
+        assert r.status_code == 200 and item["ok"]
+        assert r.json() == {"geoid": item["geoid"], "score": item["score"]}
+
+def _brute_force(geoms, lat, lon) -> np.ndarray:
+    """Lowest index of a tract covering each point (-1 if none), via shapely.covers."""
+    pts = shapely.points(lon, lat)
+    pt_idx, geom_idx = shapely.STRtree(geoms).query(pts)
+    hit = shapely.covers(geoms[geom_idx], pts[pt_idx])
+    expected = np.full(len(pts), len(geoms))
+    np.minimum.at(expected, pt_idx[hit], geom_idx[hit])
+    return np.where(expected == len(geoms), -1, expected)
+
+def test_latlon_to_geoid_score_matches_shapely_covers(tracts):
+    geoms, geoids, scores = tracts
+    rng = np.random.default_rng(2)
+
+    # Uniform points over the tiling, the islands and the rectangle strip
+    lon = np.concatenate([rng.uniform(-100.1, -89.9, 6000), rng.uniform(-89, -78, 2000)])
+    lat = np.concatenate([rng.uniform(29.9, 40.1, 6000), rng.uniform(29.99, 30.11, 2000)])
+
+    # Points 1e-9 to 1e-5 x tract extent off edge midpoints (both sides),
+    # where float32 rounding in the kernel could flip the answer
+    rings, ring_geom = shapely.get_rings(geoms, return_index=True)
+    coords, coord_ring = shapely.get_coordinates(rings, return_index=True)
+    edge = np.flatnonzero(coord_ring[:-1] == coord_ring[1:])
+    edge = rng.choice(edge, 6000)
+    a, b = coords[edge], coords[edge + 1]
+    normal = (b - a)[:, ::-1] * [1, -1] / np.hypot(*(b - a).T)[:, None]
+    bounds = shapely.bounds(geoms)[ring_geom[coord_ring[edge]]]
+    extent = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+    dist = extent * 10.0 ** rng.uniform(-9, -5, len(edge)) * rng.choice([-1, 1], len(edge))
+    near = (a + b) / 2 + normal * dist[:, None]
+    lon, lat = np.concatenate([lon, near[:, 0]]), np.concatenate([lat, near[:, 1]])
+
+    expected = _brute_force(geoms, lat, lon)
+    assert (expected >= 0).sum() > 10000  # mostly hits, with misses outside
+    for a, b, i in zip(lat.tolist(), lon.tolist(), expected.tolist()):
+        geoid, score = app_lookup.latlon_to_geoid_score(a, b)
+        if i < 0:
+            assert geoid is None
+        else:
+            assert geoid == geoids[i] and score == scores.get(geoid)
+
+def test_notched_tract_is_not_treated_as_its_bbox(load):
+    # 2 x 2 degree tract with a ~2 m x 4 m notch in its right edge, filled by
+    # a second tract: far below any area-ratio tolerance
+    notched = Polygon([(0, 0), (2, 0), (2, 1 - 1e-5), (2 - 4e-5, 1 - 1e-5),
+                       (2 - 4e-5, 1 + 1e-5), (2, 1 + 1e-5), (2, 2), (0, 2)])
+    notch = box(2 - 4e-5, 1 - 1e-5, 2, 1 + 1e-5)
+    load(np.array([notched, notch]), ["A", "B"], {"A": 1.0, "B": 2.0})
+
+    assert app_lookup.latlon_to_geoid_score(1.0, 2 - 1e-5) == ("B", 2.0)
+    assert app_lookup.latlons_to_geoid_scores([(1.0, 2 - 1e-5)]) == [("B", 2.0)]
+
+def test_reload_refused_with_multiple_workers(client, monkeypatch):
+    monkeypatch.setattr(main, "WEB_CONCURRENCY", 2)
+    assert client.post("/reload").status_code == 409
+
+def test_shared_snapshot_round_trip(tracts, restore_index, tmp_tempdir):
+    geoms, _, _ = tracts
+    rng = np.random.default_rng(3)
+    coords = shapely.get_coordinates(geoms)
+    points = np.concatenate([np.column_stack([rng.uniform(29.9, 40.1, 2000), rng.uniform(-100.1, -89.9, 2000)]),
+                             coords[rng.choice(len(coords), 500)][:, ::-1]]).tolist()
+    single = [app_lookup.latlon_to_geoid_score(a, b) for a, b in points]
+    bulk = app_lookup.latlons_to_geoid_scores(points)
+
+    shared_dir = app_lookup._load_shared()
+    assert shared_dir.parent == tmp_tempdir
+    assert os.environ["SHARED_ARRAYS_DIR"] == str(shared_dir)
+    app_lookup._unload()
+    app_lookup._attach_shared(shared_dir)
+
+    assert [app_lookup.latlon_to_geoid_score(a, b) for a, b in points] == single
+    assert app_lookup.latlons_to_geoid_scores(points) == bulk
+
+def test_shared_snapshot_write_failure_cleans_up(tracts, tmp_tempdir, monkeypatch):
+    def no_space(*args, **kwargs):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(np, "save", no_space)
+    with pytest.raises(OSError):
+        app_lookup._load_shared()
+    assert list(tmp_tempdir.iterdir()) == []
+    assert "SHARED_ARRAYS_DIR" not in os.environ
+
+@pytest.mark.parametrize("encoding", ["polygon", "multipolygon"])
+def test_geoarrow_load_matches_wkb_load(tracts, load, tmp_path, monkeypatch, encoding):
+    geoms, geoids, scores = tracts
+    if encoding == "polygon":  # without the multipolygon tracts, nothing is promoted
+        keep = shapely.get_type_id(geoms) == shapely.GeometryType.POLYGON
+        geoms, geoids = geoms[keep], geoids[keep]
+    load(geoms, geoids.tolist(), scores)
+    rng = np.random.default_rng(4)
+    coords = shapely.get_coordinates(geoms)
+    points = np.concatenate([np.column_stack([rng.uniform(29.9, 40.1, 2000), rng.uniform(-100.1, -78, 2000)]),
+                             coords[rng.choice(len(coords), 500)][:, ::-1]]).tolist()
+    single = [app_lookup.latlon_to_geoid_score(a, b) for a, b in points]
+    bulk = app_lookup.latlons_to_geoid_scores(points)
+
+    to_geoarrow.convert(str(tmp_path / "tracts_wkb.parquet"), str(tmp_path / "tracts_geoarrow.parquet"))
+    schema = pq.read_schema(tmp_path / "tracts_geoarrow.parquet")
+    assert json.loads(schema.metadata[b"geo"])["columns"]["geometry"]["encoding"] == encoding
+    monkeypatch.setattr(app_lookup, "GEOMS_PATH", tmp_path / "tracts_geoarrow.parquet")
+    app_lookup._load()
+
+    assert [app_lookup.latlon_to_geoid_score(a, b) for a, b in points] == single
+    assert app_lookup.latlons_to_geoid_scores(points) == bulk
+
+def test_load_geoparquet_with_wkb_geometry(load, tmp_path, monkeypatch):
+    load(np.array([box(0, 0, 1, 1), box(1, 0, 2, 1)]), ["A", "B"], {"A": 1.0, "B": 2.0})
+    # GeoParquet's default (e.g. geopandas to_parquet): a binary WKB "geometry" column
+    table = pq.read_table(tmp_path / "tracts_wkb.parquet").rename_columns(["GEOID", "geometry"])
+    pq.write_table(table, tmp_path / "tracts_geoparquet.parquet")
+    monkeypatch.setattr(app_lookup, "GEOMS_PATH", tmp_path / "tracts_geoparquet.parquet")
+    app_lookup._load()
+
+    assert app_lookup.latlon_to_geoid_score(0.5, 1.5) == ("B", 2.0)
+
+def test_reload_invalidates_cached_lookups(load):
+    tracts_ab = np.array([box(0, 0, 1, 1), box(1, 0, 2, 1)])
+    load(tracts_ab, ["A", "B"], {"A": 1.0, "B": 2.0})
+    assert app_lookup.latlon_to_geoid_score(0.5, 0.5) == ("A", 1.0)
+
+    load(tracts_ab, ["A", "B"], {"A": 3.0, "B": 2.0})
+    assert app_lookup.latlon_to_geoid_score(0.5, 0.5) == ("A", 3.0)
+
+def test_score_bulk_keeps_order_across_chunks(tracts, client):
+    rng = np.random.default_rng(5)
+    n = 2 * main.BULK_CHUNK_SIZE + 123  # several chunks, the last one partial
+    points = np.column_stack([rng.uniform(29.9, 40.1, n), rng.uniform(-100.1, -89.9, n)]).tolist()
+
+    bulk = client.post("/score_bulk", json={"points": points}).json()
+    assert [(item["lat"], item["lon"]) for item in bulk] == [tuple(p) for p in points]
+    assert [(item["geoid"], item["score"]) for item in bulk] == \
+        [app_lookup.latlon_to_geoid_score(a, b) for a, b in points]
+
+@pytest.mark.parametrize("lat, lon", [(float("nan"), -95.0), (35.0, float("nan")),
+                                      (91.0, -95.0), (35.0, -101.0)])
+def test_nan_and_out_of_extent_points_are_not_in_tract(client, lat, lon):
+    assert app_lookup.latlon_to_geoid_score(lat, lon) == (None, None)
+    assert client.get("/score", params={"lat": lat, "lon": lon}).status_code == 404
+
+    # json.dumps writes NaN as the bare literal Python's parser accepts (httpx's json= refuses)
+    body = json.dumps({"points": [[35.0, -95.0], [lat, lon]]})
+    bulk = client.post("/score_bulk", content=body, headers={"Content-Type": "application/json"}).json()
+    assert bulk[0]["ok"]
+    assert not bulk[1]["ok"] and bulk[1]["geoid"] is None and bulk[1]["error"] == "not_in_tract"
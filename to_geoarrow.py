@@ -0,0 +1,52 @@
+# to_geoarrow.py
+"""
+Re-encode a GEOID + wkb tract parquet as GeoArrow (native coordinate
+buffers), which app_lookup loads without per-row WKB parsing.
+
+Usage:
+    python to_geoarrow.py /data/tracts_wkb.parquet /data/tracts_geoarrow.parquet
+then point GEOMS_PATH at the new file and call /reload.
+"""
+import sys
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+import shapely
+
+def convert(src: str, dst: str) -> None:
+    table = pq.read_table(src, columns=["GEOID", "wkb"])
+    geoms = shapely.from_wkb(table.column("wkb").to_numpy())
+
+    # Mixed Polygon/MultiPolygon input is promoted to MultiPolygon
+    geom_type, coords, offsets = shapely.to_ragged_array(geoms)
+    if geom_type == shapely.GeometryType.POLYGON:
+        encoding, type_name = "polygon", "Polygon"
+    elif geom_type == shapely.GeometryType.MULTIPOLYGON:
+        encoding, type_name = "multipolygon", "MultiPolygon"
+    else:
+        raise ValueError(f"Expected polygon geometries, got {geom_type.name}")
+
+    # GeoParquet's GeoArrow encoding uses separated struct<x, y> coords
+    arr = pa.StructArray.from_arrays([pa.array(coords[:, 0]), pa.array(coords[:, 1])],
+                                     names=["x", "y"])
+    for off in offsets:  # innermost (ring) offsets first
+        arr = pa.ListArray.from_arrays(pa.array(np.asarray(off, dtype=np.int32)), arr)
+
+    geo = {
+        "version": "1.1.0",
+        "primary_column": "geometry",
+        "columns": {"geometry": {"encoding": encoding, "geometry_types": [type_name]}},
+    }
+    field = pa.field("geometry", arr.type,
+                     metadata={"ARROW:extension:name": f"geoarrow.{encoding}"})
+    schema = pa.schema([table.schema.field("GEOID"), field],
+                       metadata={"geo": json.dumps(geo)})
+    out = pa.Table.from_arrays([table.column("GEOID"), arr], schema=schema)
+    pq.write_table(out, dst)
+    print(f"Wrote {len(geoms)} geometries ({encoding}) -> {dst}")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        sys.exit("usage: python to_geoarrow.py SRC_WKB_PARQUET DST_GEOARROW_PARQUET")
+    convert(sys.argv[1], sys.argv[2])